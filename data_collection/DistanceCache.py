@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the DTSPN distance matrices
+
+The matrices are stored as .npy files named by the fingerprint of the problem
+and loaded as memory maps. The least recently used files are evicted when the
+cache exceeds its size.
+"""
+import os
+import hashlib
+import tempfile
+import numpy as np
+
+# version of the stored matrices, change when the distances are computed differently
+CACHE_VERSION = 1
+
+class DistanceCache:
+    def __init__(self, directory=None, max_bytes=2**30):
+        """
+        Parameters
+        ----------
+        directory: str
+            directory of the cached matrices, a directory in the system temp if None
+        max_bytes: int
+            maximal total size of the cached matrices
+        """
+        if directory is None:
+            directory = os.path.join(tempfile.gettempdir(), 'dtspn_cache')
+        self.directory = directory
+        self.max_bytes = max_bytes
+        os.makedirs(self.directory, exist_ok=True)
+
+    def key(self, samples, turning_radius, **options):
+        """
+        Fingerprint of the problem. The samples determine the goals, sensing radius
+        and sampling resolution, the options are e.g. the neighbors of the lazy matrix.
+
+        Parameters
+        ----------
+        samples: list of array (M_i, 3)
+            SE2 states of the samples of each goal
+        turning_radius: float
+            turning radius for the Dubins vehicle model
+
+        Returns
+        -------
+        str
+            hexadecimal hash
+        """
+        fingerprint = hashlib.sha1()
+        fingerprint.update(repr((CACHE_VERSION, float(turning_radius), sorted(options.items()))).encode())
+        for s in samples:
+            s = np.ascontiguousarray(s, dtype=float).reshape(-1, 3)
+            fingerprint.update(np.int64(len(s)).tobytes())
+            fingerprint.update(s.tobytes())
+        return fingerprint.hexdigest()
+
+    def path(self, key):
+        return os.path.join(self.directory, key + '.npy')
+
+    def get(self, key):
+        """
+        Parameters
+        ----------
+        key: str
+            fingerprint of the problem
+
+        Returns
+        -------
+        array
+            read-only memory mapped matrix or None if the matrix is not cached
+        """
+        try:
+            distances = np.load(self.path(key), mmap_mode='r')
+            # the modification time orders the files for the eviction
+            os.utime(self.path(key))
+        except (FileNotFoundError, ValueError):
+            return None
+        return distances
+
+    def put(self, key, distances):
+        """
+        Store the matrix and evict the least recently used matrices over the size limit.
+
+        Parameters
+        ----------
+        key: str
+            fingerprint of the problem
+        distances: array
+            matrix to be stored
+        """
+        # write to a temporary file and rename, so the concurrent readers see complete files only
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                np.save(f, np.asarray(distances))
+            os.replace(tmp, self.path(key))
+        except BaseException:
+            os.remove(tmp)
+            raise
+        self.evict(keep=key)
+
+    def evict(self, keep=None):
+        entries = []
+        for name in os.listdir(self.directory):
+            if not name.endswith('.npy'):
+                continue
+            try:
+                stat = os.stat(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, name))
+        entries.sort()
+
+        total = sum(size for _, size, _ in entries)
+        for _, size, name in entries:
+            if total <= self.max_bytes:
+                break
+            if name == str(keep) + '.npy':
+                continue
+            try:
+                os.remove(os.path.join(self.directory, name))
+            except FileNotFoundError:
+                pass
+            total -= size
+
+    def distance_matrix(self, samples, turning_radius, build, **options):
+        """
+        Load the cached matrix or build and store it.
+
+        Parameters
+        ----------
+        samples: list of array (M_i, 3)
+            SE2 states of the samples of each goal
+        turning_radius: float
+            turning radius for the Dubins vehicle model
+        build: callable
+            build() returns the matrix if it is not cached
+
+        Returns
+        -------
+        array
+            the distance matrix, memory mapped if it was cached
+        """
+        key = self.key(samples, turning_radius, **options)
+        distances = self.get(key)
+        if distances is None:
+            distances = build()
+            self.put(key, distances)
+        return distances
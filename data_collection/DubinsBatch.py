@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+"""
+Vectorized Dubins shortest paths over NumPy arrays of SE2 states
+
+The formulas follow the dubins library (A. Walker), so the word codes and the
+segment parameters are compatible with dubins.shortest_path.
+"""
+import numpy as np
+
+# Dubins words, the same codes as in the dubins library
+LSL = 0
+LSR = 1
+RSL = 2
+RSR = 3
+RLR = 4
+LRL = 5
+
+def mod2pi(theta):
+    return theta - 2 * np.pi * np.floor(theta / (2 * np.pi))
+
+def shortest_paths(starts, ends, turning_radius):
+    """
+    Compute the shortest Dubins paths between the start and end states.
+
+    Parameters
+    ----------
+    starts: array (..., 3)
+        start states (x, y, theta)
+    ends: array (..., 3)
+        end states (x, y, theta), broadcast against the starts
+    turning_radius: float
+        turning radius for the Dubins vehicle model
+
+    Returns
+    -------
+    lengths: array (...)
+        lengths of the shortest paths
+    words: int array (...)
+        types of the shortest paths (LSL, LSR, RSL, RSR, RLR, LRL)
+    params: array (..., 3)
+        lengths of the three segments of the paths normalized by the turning radius
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    dx = ends[..., 0] - starts[..., 0]
+    dy = ends[..., 1] - starts[..., 1]
+    d = np.hypot(dx, dy) / turning_radius
+    theta = np.where(d > 0, mod2pi(np.arctan2(dy, dx)), 0.0)
+    alpha = mod2pi(starts[..., 2] - theta)
+    beta = mod2pi(ends[..., 2] - theta)
+
+    sa, sb = np.sin(alpha), np.sin(beta)
+    ca, cb = np.cos(alpha), np.cos(beta)
+    c_ab = np.cos(alpha - beta)
+    d_sq = d * d
+
+    shape = d.shape
+    params = np.full((6, 3) + shape, np.inf)
+
+    with np.errstate(invalid='ignore'):
+        # LSL
+        p_sq = 2 + d_sq - 2 * c_ab + 2 * d * (sa - sb)
+        tmp1 = np.arctan2(cb - ca, d + sa - sb)
+        valid = p_sq >= 0
+        params[LSL] = np.where(valid, (mod2pi(tmp1 - alpha), np.sqrt(p_sq), mod2pi(beta - tmp1)), np.inf)
+
+        # RSR
+        p_sq = 2 + d_sq - 2 * c_ab + 2 * d * (sb - sa)
+        tmp1 = np.arctan2(ca - cb, d - sa + sb)
+        valid = p_sq >= 0
+        params[RSR] = np.where(valid, (mod2pi(alpha - tmp1), np.sqrt(p_sq), mod2pi(tmp1 - beta)), np.inf)
+
+        # LSR
+        p_sq = -2 + d_sq + 2 * c_ab + 2 * d * (sa + sb)
+        p = np.sqrt(p_sq)
+        tmp0 = np.arctan2(-ca - cb, d + sa + sb) - np.arctan2(-2.0, p)
+        valid = p_sq >= 0
+        params[LSR] = np.where(valid, (mod2pi(tmp0 - alpha), p, mod2pi(tmp0 - beta)), np.inf)
+
+        # RSL
+        p_sq = -2 + d_sq + 2 * c_ab - 2 * d * (sa + sb)
+        p = np.sqrt(p_sq)
+        tmp0 = np.arctan2(ca + cb, d - sa - sb) - np.arctan2(2.0, p)
+        valid = p_sq >= 0
+        params[RSL] = np.where(valid, (mod2pi(alpha - tmp0), p, mod2pi(beta - tmp0)), np.inf)
+
+        # RLR
+        tmp0 = (6. - d_sq + 2 * c_ab + 2 * d * (sa - sb)) / 8.
+        phi = np.arctan2(ca - cb, d - sa + sb)
+        p = mod2pi(2 * np.pi - np.arccos(tmp0))
+        t = mod2pi(alpha - phi + mod2pi(p / 2.))
+        valid = np.abs(tmp0) <= 1
+        params[RLR] = np.where(valid, (t, p, mod2pi(alpha - beta - t + p)), np.inf)
+
+        # LRL
+        tmp0 = (6. - d_sq + 2 * c_ab + 2 * d * (sb - sa)) / 8.
+        phi = np.arctan2(ca - cb, d + sa - sb)
+        p = mod2pi(2 * np.pi - np.arccos(tmp0))
+        t = mod2pi(-alpha - phi + p / 2.)
+        valid = np.abs(tmp0) <= 1
+        params[LRL] = np.where(valid, (t, p, mod2pi(beta - alpha - t + p)), np.inf)
+
+    costs = np.sum(params, axis=1)
+    words = np.argmin(costs, axis=0)
+    lengths = np.take_along_axis(costs, words[None], axis=0)[0] * turning_radius
+    params = np.moveaxis(np.take_along_axis(params, words[None, None], axis=0)[0], 0, -1)
+    return lengths, words, params
+
+def shortest_path_lengths(starts, ends, turning_radius):
+    """
+    Compute the lengths of the shortest Dubins paths between the start and end states.
+
+    Parameters
+    ----------
+    starts: array (..., 3)
+        start states (x, y, theta)
+    ends: array (..., 3)
+        end states (x, y, theta), broadcast against the starts
+    turning_radius: float
+        turning radius for the Dubins vehicle model
+
+    Returns
+    -------
+    array (...)
+        lengths of the shortest paths
+    """
+    return shortest_paths(starts, ends, turning_radius)[0]
+
+def distance_matrix(starts, ends, turning_radius):
+    """
+    Compute the matrix of the shortest Dubins path lengths between all pairs of states.
+
+    Parameters
+    ----------
+    starts: array (A, 3)
+        start states (x, y, theta)
+    ends: array (B, 3)
+        end states (x, y, theta)
+    turning_radius: float
+        turning radius for the Dubins vehicle model
+
+    Returns
+    -------
+    array (A, B)
+        lengths of the shortest paths from starts[a] to ends[b]
+    """
+    starts = np.asarray(starts, dtype=float)
+    ends = np.asarray(ends, dtype=float)
+    return shortest_path_lengths(starts[:, None, :], ends[None, :, :], turning_radius)
+
+# turning directions of the segments of each word, +1 left, -1 right, 0 straight
+SEGMENT_TURNS = np.array([
+    [1, 0, 1],      # LSL
+    [1, 0, -1],     # LSR
+    [-1, 0, 1],     # RSL
+    [-1, 0, -1],    # RSR
+    [-1, 1, -1],    # RLR
+    [1, -1, 1],     # LRL
+])
+
+def _segment(t, start, turn):
+    """
+    Move along a segment of the normalized path (unit turning radius) from the start states (..., 3).
+    """
+    x, y, theta = start[..., 0], start[..., 1], start[..., 2]
+    st, ct = np.sin(theta), np.cos(theta)
+    end = np.empty(np.broadcast(t, theta).shape + (3,))
+    end[..., 0] = x + np.where(turn == 0, ct * t, turn * (np.sin(theta + turn * t) - st))
+    end[..., 1] = y + np.where(turn == 0, st * t, turn * (ct - np.cos(theta + turn * t)))
+    end[..., 2] = theta + turn * t
+    return end
+
+def sample_paths(starts, words, params, turning_radius, step_size, dtype=float):
+    """
+    Sample the Dubins paths with the given step as dubins.DubinsPath.sample_many, 
+    i.e., at the distances 0, step_size, ... less than the path length.
+
+    Parameters
+    ----------
+    starts: array (P, 3)
+        start states (x, y, theta) of the paths
+    words: int array (P)
+        types of the paths (LSL, LSR, RSL, RSR, RLR, LRL)
+    params: array (P, 3)
+        lengths of the three segments of the paths normalized by the turning radius
+    turning_radius: float
+        turning radius for the Dubins vehicle model
+    step_size: float
+        distance between the samples along the path
+    dtype: numpy dtype
+        type of the returned samples, e.g., np.float32 for large tours
+
+    Returns
+    -------
+    samples: array (K, 3)
+        SE2 states (x, y, theta) of the samples of all paths, path by path
+    counts: int array (P)
+        number of the samples of each path
+    """
+    starts = np.asarray(starts, dtype=float).reshape(-1, 3)
+    words = np.asarray(words).reshape(-1)
+    params = np.asarray(params, dtype=float).reshape(-1, 3)
+
+    lengths = params.sum(axis=1) * turning_radius
+    counts = np.ceil(lengths / step_size).astype(int)
+    path = np.repeat(np.arange(len(counts)), counts)
+    t = (np.arange(len(path)) - np.repeat(np.cumsum(counts) - counts, counts)) * step_size / turning_radius
+
+    # ends of the first two segments of the normalized paths starting at the origin
+    turns = SEGMENT_TURNS[words]
+    origin = np.zeros((len(starts), 3))
+    origin[:, 2] = starts[:, 2]
+    first = _segment(params[:, 0], origin, turns[:, 0])
+    second = _segment(params[:, 1], first, turns[:, 1])
+
+    p1 = params[path, 0]
+    p2 = params[path, 1]
+    segment = np.where(t < p1, 0, np.where(t < p1 + p2, 1, 2))
+    offset = np.choose(segment, [0, p1, p1 + p2])
+    segment_start = np.choose(segment[:, None], [origin[path], first[path], second[path]])
+    q = _segment(t - offset, segment_start, turns[path, segment])
+
+    samples = np.empty((len(path), 3), dtype=dtype)
+    samples[:, 0] = q[:, 0] * turning_radius + starts[path, 0]
+    samples[:, 1] = q[:, 1] * turning_radius + starts[path, 1]
+    samples[:, 2] = mod2pi(q[:, 2])
+    return samples, counts
+
+def sample_tour(states, turning_radius, step_size, dtype=float):
+    """
+    Sample the closed tour of the shortest Dubins paths through the given states.
+
+    Parameters
+    ----------
+    states: array (N, 3)
+        states (x, y, theta) visited by the tour in the given order
+    turning_radius: float
+        turning radius for the Dubins vehicle model
+    step_size: float
+        distance between the samples along the paths
+    dtype: numpy dtype
+        type of the returned samples
+
+    Returns
+    -------
+    samples: array (K, 3)
+        SE2 states (x, y, theta) of the samples
+    counts: int array (N)
+        number of the samples of each path
+    lengths: array (N)
+        lengths of the paths from the state a to a+1
+    """
+    states = np.asarray(states, dtype=float).reshape(-1, 3)
+    lengths, words, params = shortest_paths(states, np.roll(states, -1, axis=0), turning_radius)
+    samples, counts = sample_paths(states, words, params, turning_radius, step_size, dtype)
+    return samples, counts, lengths
@@ -25,98 +25,496 @@
 #	Kostas Alexis (kalexis@unr.edu)
 # 
 import os
+import re
 import math
+import time
+import shutil
+import asyncio
+import tempfile
+import subprocess
 import numpy as np
 
 # Change these directories based on where you have 
 # a compiled executable of the LKH TSP Solver
 lkh_dir = '/LKH-2.0.9/'    # relative path
-tsplib_dir = '/tmp/LKH_files/' # absolute path
+tsplib_dir = '/tmp/LKH_files/' # absolute path, each call of solve_TSP uses its own subdirectory
 lkh_cmd = 'LKH'                # name of the program
 pwd= os.path.dirname(os.path.abspath(__file__))
 
+# LKH parameters of the effort/latency profiles, balanced is the default
+# fast skips the subgradient optimization and stops after a few trials
+LKH_profiles = {
+    'fast': {'MOVE_TYPE': 3, 'PATCHING_C': 0, 'PATCHING_A': 0, 'RUNS': 1, 'MAX_TRIALS': 10, 'SUBGRADIENT': 'NO'},
+    'balanced': {'MOVE_TYPE': 5, 'PATCHING_C': 3, 'PATCHING_A': 2, 'RUNS': 3},
+    'quality': {'MOVE_TYPE': 5, 'PATCHING_C': 3, 'PATCHING_A': 2, 'RUNS': 10},
+}
+
+# share of the deadline of the portfolio left for the preprocessing of LKH, see portfolio_time_limit
+portfolio_margin = 0.5
+
 # compute the shortest sequence based on the distance matrix (self.distances)
-def solve_TSP(distance_matrix):
-    max_value = np.max(np.max(distance_matrix))
-    scaled_matrix = (10000000 / max_value) * distance_matrix
+# initial_tour is a previous sequence to start from (see repair_tour), the LKH settings are in LKH_parameters
+def solve_TSP(distance_matrix, timeout=None, return_report=False, initial_tour=None, runs=None, max_trials=None,
+              profile='balanced', parameters=None, time_limit=None):
+    fname_tsp, work_dir, scale, parameters, initial_tour = write_TSP(
+        distance_matrix, initial_tour, runs, max_trials, profile, parameters, time_limit)
+    return solve_problem(fname_tsp, work_dir, scale, timeout, return_report, parameters, initial_tour)
+
+# write the problem of solve_TSP, return the arguments of solve_problem
+def write_TSP(distance_matrix, initial_tour=None, runs=None, max_trials=None,
+              profile='balanced', parameters=None, time_limit=None):
     fname_tsp = "problem"
-    user_comment = "a comment by the user"
-    writeTSPLIBfile_FE(fname_tsp, scaled_matrix, user_comment)
-    run_LKHsolver_cmd(fname_tsp)
-    sequence = read_LKHresult_cmd(fname_tsp)
+    if initial_tour is not None:
+        initial_tour = repair_tour(initial_tour, distance_matrix)
+        if runs is None and 'RUNS' not in (parameters or {}):
+            runs = 1
+    parameters = LKH_parameters(profile, parameters, time_limit, RUNS=runs, MAX_TRIALS=max_trials)
+    work_dir, scale = write_problem(fname_tsp, distance_matrix)
+    return fname_tsp, work_dir, scale, parameters, initial_tour
+
+# compute the shortest sequence through the points (N, 2), LKH computes the distances
+# given by the TSPLIB metric ('EUC_2D' or 'ATT') from the coordinates
+# the coordinates are scaled for the precision of the integer distances
+def solve_TSP_coords(points, metric='EUC_2D', timeout=None, return_report=False,
+                     profile='balanced', parameters=None, time_limit=None):
+    fname_tsp = "problem"
+    parameters = LKH_parameters(profile, parameters, time_limit)
+    work_dir, scale = write_coords_problem(fname_tsp, points, metric)
+    return solve_problem(fname_tsp, work_dir, scale, timeout, return_report, parameters)
+
+# compute the shortest sequence of the ATSP with the nodes 0..dimension-1 given only by
+# the listed directed edges (E, 2) and their costs, the other edges have a large cost in LKH
+def solve_ATSP_edges(dimension, edges, costs, timeout=None, return_report=False,
+                     profile='balanced', parameters=None, time_limit=None):
+    fname_tsp = "problem"
+    parameters = LKH_parameters(profile, parameters, time_limit)
+    work_dir, scale = write_edges_problem(fname_tsp, dimension, edges, costs)
+    return solve_problem(fname_tsp, work_dir, scale, timeout, return_report, parameters)
+
+# LKH parameters {KEYWORD: value} of the profile updated by the parameters and the keywords not None
+def LKH_parameters(profile='balanced', parameters=None, time_limit=None, **keywords):
+    if profile not in LKH_profiles:
+        raise ValueError('Unknown LKH profile %r, expected one of %s' % (profile, ', '.join(LKH_profiles)))
+    settings = dict(LKH_profiles[profile])
+    settings.update(parameters or {})
+    keywords['TIME_LIMIT'] = time_limit
+    for keyword, value in keywords.items():
+        if value is not None:
+            settings[keyword] = value
+    return settings
+
+# run LKH on the problem written in work_dir and remove the directory,
+# the parameters (see writeLKHparameters) and the initial tour are written first if given
+def solve_problem(fname_tsp, work_dir, scale, timeout=None, return_report=False, parameters=None, initial_tour=None):
+    try:
+        writeLKHinput(fname_tsp, work_dir, parameters, initial_tour)
+        start = time.perf_counter()
+        output = run_LKHsolver_cmd(fname_tsp, work_dir, timeout)
+        return read_LKHsolution(fname_tsp, work_dir, scale, return_report, output, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# write the parameters and the initial tour of solve_problem if given
+def writeLKHinput(fname_tsp, work_dir, parameters=None, initial_tour=None):
+    parameters = dict(parameters or {})
+    if initial_tour is not None:
+        parameters['INITIAL_TOUR_FILE'] = writeTSPLIBtour(fname_tsp, initial_tour, work_dir)
+    if parameters:
+        writeLKHparameters(fname_tsp, work_dir, parameters)
+
+# the sequence of solve_problem, with the report if return_report
+def read_LKHsolution(fname_tsp, work_dir, scale, return_report, output, wall_time):
+    sequence = read_LKHresult_cmd(fname_tsp, work_dir)
+    if return_report:
+        return sequence, make_report(output, scale, wall_time)
     return sequence
 
+# solve the problem by a portfolio of LKH processes with distinct seeds, return the best tour found by the deadline
+# the deadline does not bound the preprocessing of LKH, TimeoutError is raised if there is no tour
+def solve_TSP_portfolio(distance_matrix, seeds=4, deadline=None, return_report=False,
+                        profile='balanced', parameters=None, time_limit=None, workers=None):
+    fname_tsp = "problem"
+    parameters = LKH_parameters(profile, parameters, time_limit)
+    work_dir, scale = write_problem(fname_tsp, distance_matrix)
+    return solve_portfolio(fname_tsp, work_dir, scale, seeds, deadline, return_report, parameters, workers)
+
+# portfolio variant of solve_TSP_coords, see solve_TSP_portfolio
+def solve_TSP_coords_portfolio(points, metric='EUC_2D', seeds=4, deadline=None, return_report=False,
+                               profile='balanced', parameters=None, time_limit=None, workers=None):
+    fname_tsp = "problem"
+    parameters = LKH_parameters(profile, parameters, time_limit)
+    work_dir, scale = write_coords_problem(fname_tsp, points, metric)
+    return solve_portfolio(fname_tsp, work_dir, scale, seeds, deadline, return_report, parameters, workers)
+
+# run LKH for each seed in its own subdirectory of work_dir, at most workers processes (all CPUs if None) at once
+def solve_portfolio(fname_tsp, work_dir, scale, seeds=4, deadline=None, return_report=False, parameters=None, workers=None):
+    start = time.perf_counter()
+    processes = []
+    try:
+        seeds = list(range(1, seeds + 1)) if isinstance(seeds, int) else list(seeds)
+        if len(set(seeds)) != len(seeds):
+            raise ValueError('Duplicate LKH seeds %s, the processes would find the same tour' % seeds)
+        parameters = dict(parameters or {})
+        runs = parameters.get('RUNS', LKH_profiles['balanced']['RUNS'])
+        if workers is None:
+            workers = os.cpu_count() or 1
+
+        pending = list(seeds)
+        while True:
+            running = sum(process.poll() is None for _, _, process in processes)
+            left = None if deadline is None else deadline - (time.perf_counter() - start)
+            if (running == 0 and not pending) or (left is not None and left <= 0):
+                break
+            while pending and running < workers:
+                seed = pending.pop(0)
+                seed_dir = os.path.join(work_dir, 'seed_%d' % seed)
+                os.makedirs(seed_dir)
+                problem_file = os.path.join(work_dir, fname_tsp + '.tsp')
+                try:
+                    os.link(problem_file, os.path.join(seed_dir, fname_tsp + '.tsp'))
+                except OSError:
+                    shutil.copyfile(problem_file, os.path.join(seed_dir, fname_tsp + '.tsp'))
+                seed_parameters = dict(parameters, SEED=seed)
+                if left is not None and 'TIME_LIMIT' not in parameters:
+                    seed_parameters['TIME_LIMIT'] = portfolio_time_limit(left, runs)
+                writeLKHparameters(fname_tsp, seed_dir, seed_parameters)
+                # the output goes to a file, a pipe not read until the end could block LKH
+                with open(os.path.join(seed_dir, 'output.txt'), 'wb') as output:
+                    process = subprocess.Popen(LKH_command(fname_tsp, seed_dir), stdout=output, stderr=subprocess.STDOUT)
+                processes.append((seed, seed_dir, process))
+                running += 1
+            time.sleep(0.005)
+        # stop the stragglers before reading their tour files
+        finished = 0
+        for _, _, process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+            else:
+                finished += 1
+        wall_time = time.perf_counter() - start
+
+        best = None
+        costs = {}
+        for seed, seed_dir, process in processes:
+            with open(os.path.join(seed_dir, 'output.txt'), errors='replace') as f:
+                output = f.read()
+            tour = read_LKHtour(fname_tsp, seed_dir)
+            if tour is None:
+                # a failure of LKH, not the kill at the deadline
+                if process.returncode > 0:
+                    check_LKHoutput(process.returncode, output)
+                continue
+            sequence, cost = tour
+            costs[seed] = cost / float(scale)
+            if best is None or cost < best[1]:
+                best = (sequence, cost, seed, output)
+    finally:
+        for _, _, process in processes:
+            if process.poll() is None:
+                process.kill()
+                process.wait()
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+    if best is None:
+        raise TimeoutError('LKH found no tour in %g s' % wall_time)
+    sequence, cost, seed, output = best
+    if return_report:
+        report = make_report(output, scale, wall_time)
+        report['lkh_cost'] = cost
+        report['cost'] = cost / float(scale)
+        report['seed'] = seed
+        report['costs'] = costs
+        report['finished'] = finished
+        return sequence, report
+    return sequence
+
+# TIME_LIMIT of each run to finish the runs by the deadline, portfolio_margin is left for the preprocessing
+def portfolio_time_limit(deadline, runs):
+    return max(deadline * (1.0 - portfolio_margin), 0.0) / max(runs, 1) + 1e-3
+
+# make a tour through all nodes from a previous sequence, the invalid and repeated nodes are dropped
+# and the missing nodes are inserted where they increase the tour length the least
+def repair_tour(sequence, distance_matrix):
+    distance_matrix = np.asarray(distance_matrix)
+    dims_tsp = len(distance_matrix)
+    tour = []
+    visited = np.zeros(dims_tsp, dtype=bool)
+    for node in sequence:
+        if node is None or not 0 <= node < dims_tsp or visited[node]:
+            continue
+        tour.append(int(node))
+        visited[node] = True
+
+    for node in np.flatnonzero(~visited):
+        if len(tour) < 2:
+            tour.append(int(node))
+            continue
+        succ = np.roll(tour, -1)
+        increase = distance_matrix[tour, node] + distance_matrix[node, succ] - distance_matrix[tour, succ]
+        tour.insert(int(np.argmin(increase)) + 1, int(node))
+    return tour
+
+# asyncio variant of solve_TSP, LKH runs as a child process while the event loop continues
+async def solve_TSP_async(distance_matrix, timeout=None, return_report=False, initial_tour=None, runs=None, max_trials=None,
+                          profile='balanced', parameters=None, time_limit=None):
+    fname_tsp, work_dir, scale, parameters, initial_tour = await asyncio.to_thread(
+        write_TSP, distance_matrix, initial_tour, runs, max_trials, profile, parameters, time_limit)
+    try:
+        writeLKHinput(fname_tsp, work_dir, parameters, initial_tour)
+        start = time.perf_counter()
+        output = await run_LKHsolver_async(fname_tsp, work_dir, timeout)
+        return read_LKHsolution(fname_tsp, work_dir, scale, return_report, output, time.perf_counter() - start)
+    finally:
+        shutil.rmtree(work_dir, ignore_errors=True)
+
+# asyncio variant of run_LKHsolver_cmd, LKH is killed also on the cancellation of the task
+async def run_LKHsolver_async(fname_basis, work_dir=tsplib_dir, timeout=None):
+    process = await asyncio.create_subprocess_exec(*LKH_command(fname_basis, work_dir),
+        stdout=asyncio.subprocess.PIPE, stderr=asyncio.subprocess.STDOUT)
+    try:
+        output, _ = await asyncio.wait_for(process.communicate(), timeout)
+    except asyncio.TimeoutError:
+        raise TimeoutError('LKH did not finish in %g s' % timeout) from None
+    finally:
+        if process.returncode is None:
+            process.kill()
+            await process.wait()
+    output = output.decode(errors='replace')
+    check_LKHoutput(process.returncode, output)
+    return output
+
+# write the scaled problem into a new temporary directory, return the directory and the scale
+def write_problem(fname_tsp, distance_matrix):
+    max_value = np.max(np.max(distance_matrix))
+    scale = 10000000 / max_value
+    scaled_matrix = scale * distance_matrix
+    user_comment = "a comment by the user"
+    return make_problem_dir(writeTSPLIBfile_FE, fname_tsp, scaled_matrix, user_comment), scale
+
+def write_coords_problem(fname_tsp, points, metric):
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    extent = np.max(np.ptp(points, axis=0)) if len(points) else 0
+    scale = 1000000 / extent if extent > 0 else 1.0
+    user_comment = "a comment by the user"
+    return make_problem_dir(writeTSPLIBfile_coords, fname_tsp, scale * points, metric, user_comment), scale
 
-def writeTSPLIBfile_FE(fname_tsp,CostMatrix,user_comment):
-    if not os.path.exists(tsplib_dir):
-        os.makedirs(tsplib_dir)
+def write_edges_problem(fname_tsp, dimension, edges, costs):
+    # the listed edges stay well below the cost of the missing edges (10000000 in LKH)
+    max_value = max(np.max(costs), 1e-9) if len(costs) else 1.0
+    scale = 1000000 / max_value
+    user_comment = "a comment by the user"
+    return make_problem_dir(writeTSPLIBfile_edges, fname_tsp, dimension, edges, scale * np.asarray(costs), user_comment), scale
+
+# call the writer(fname_tsp, ..., work_dir) in a new temporary directory
+def make_problem_dir(writer, fname_tsp, *args):
+    os.makedirs(tsplib_dir, exist_ok=True)
+    work_dir = tempfile.mkdtemp(prefix='LKH_', dir=tsplib_dir)
+    try:
+        writer(fname_tsp, *args, work_dir)
+    except BaseException:
+        shutil.rmtree(work_dir, ignore_errors=True)
+        raise
+    return work_dir
+
+# parse the cost and times reported by LKH to the standard output
+def parse_LKHoutput(output):
+    report = {'cost': None, 'preprocessing_time': None, 'runs': []}
+    match = re.search(r'Cost\.min = (-?\d+)', output)
+    if match:
+        report['cost'] = int(match.group(1))
+    match = re.search(r'Preprocessing time = ([\d.]+) sec', output)
+    if match:
+        report['preprocessing_time'] = float(match.group(1))
+    for cost, run_time in re.findall(r'Run \d+: Cost = (-?\d+), Time = ([\d.]+) sec', output):
+        report['runs'].append((int(cost), float(run_time)))
+    return report
+
+# LKH report with the cost in the units of the distance matrix
+def make_report(output, scale, wall_time):
+    report = parse_LKHoutput(output)
+    report['lkh_cost'] = report['cost']
+    if report['cost'] is not None:
+        report['cost'] = report['cost'] / float(scale)
+    report['wall_time'] = wall_time
+    return report
+
+def check_LKHoutput(returncode, output):
+    if returncode != 0:
+        raise RuntimeError('LKH failed with the exit status %d:\n%s' % (returncode, output[-2000:]))
+
+
+# format the rows of a non-negative integer matrix as fixed width columns,
+# with upper only the entries above the diagonal are formatted (first_row is the index of the first row)
+def format_matrix_rows(matrix, width, first_row=0, upper=False):
+    value = matrix.copy()
+    text = np.full(matrix.shape + (width + 1,), ord(' '), dtype=np.uint8)
+    for k in range(width):
+        digit = (value % 10).astype(np.uint8) + ord('0')
+        # leading zeros are replaced by spaces
+        text[..., width - 1 - k] = digit if k == 0 else np.where(matrix >= 10**k, digit, ord(' '))
+        value //= 10
+    text[:, -1, width] = ord('\n')
+    if upper:
+        rows = np.arange(first_row, first_row + len(matrix))
+        text = text[np.arange(matrix.shape[1])[None, :] > rows[:, None]]
+    return text.tobytes()
+
+# write the EDGE_WEIGHT_SECTION in chunks of about chunk_bytes
+def write_matrix_section(fileID, matrix, upper=False, chunk_bytes=2**24):
+    if matrix.size == 0:
+        return
+    if np.min(matrix) < 0:
+        # the fixed width formatting handles non-negative values only
+        for i, row in enumerate(matrix.tolist()):
+            fileID.write((' '.join(map(str, row[i+1:] if upper else row)) + '\n').encode())
+        return
+    width = len(str(int(np.max(matrix))))
+    rows = max(1, chunk_bytes // (matrix.shape[1] * (width + 1)))
+    for first in range(0, len(matrix), rows):
+        fileID.write(format_matrix_rows(matrix[first:first + rows], width, first, upper))
+
+# symmetric matrices are written as UPPER_ROW of a TSP unless symmetric is False
+def writeTSPLIBfile_FE(fname_tsp,CostMatrix,user_comment,work_dir=tsplib_dir,symmetric=None):
+    work_dir = os.path.join(work_dir, '')
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir, exist_ok=True)
+    # the costs are truncated as by int()
+    CostMatrix = np.asarray(CostMatrix).astype(np.int64)
+    if symmetric is None:
+        symmetric = np.array_equal(CostMatrix, CostMatrix.T)
     dims_tsp = len(CostMatrix)
     name_line = 'NAME : ' + fname_tsp + '\n'
     type_line = 'TYPE: ATSP' + '\n'
     comment_line = 'COMMENT : ' + user_comment + '\n'
-    tsp_line = 'TYPE : ' + 'ATSP' + '\n'
+    tsp_line = 'TYPE : ' + ('TSP' if symmetric else 'ATSP') + '\n'
     dimension_line = 'DIMENSION : ' + str(dims_tsp) + '\n'
     edge_weight_type_line = 'EDGE_WEIGHT_TYPE : ' + 'EXPLICIT' + '\n' # explicit only
-    edge_weight_format_line = 'EDGE_WEIGHT_FORMAT: ' + 'FULL_MATRIX' + '\n'
+    edge_weight_format_line = 'EDGE_WEIGHT_FORMAT: ' + ('UPPER_ROW' if symmetric else 'FULL_MATRIX') + '\n'
     display_data_type_line ='DISPLAY_DATA_TYPE: ' + 'NO_DISPLAY' + '\n' # 'NO_DISPLAY'
     edge_weight_section_line = 'EDGE_WEIGHT_SECTION' + '\n'
     eof_line = 'EOF\n'
-    Cost_Matrix_STRline = []
-    for i in range(0,dims_tsp):
-        cost_matrix_strline = ''
-        for j in range(0,dims_tsp-1):
-            cost_matrix_strline = cost_matrix_strline + str(int(CostMatrix[i][j])) + ' '
-
-        j = dims_tsp-1
-        cost_matrix_strline = cost_matrix_strline + str(int(CostMatrix[i][j]))
-        cost_matrix_strline = cost_matrix_strline + '\n'
-        Cost_Matrix_STRline.append(cost_matrix_strline)
     
-    fileID = open((tsplib_dir + fname_tsp + '.tsp'), "w")
+    fileID = open((work_dir + fname_tsp + '.tsp'), "wb")
     # print(name_line)
-    fileID.write(name_line)
-    fileID.write(comment_line)
-    fileID.write(tsp_line)
-    fileID.write(dimension_line)
-    fileID.write(edge_weight_type_line)
-    fileID.write(edge_weight_format_line)
-    fileID.write(edge_weight_section_line)
-    for i in range(0,len(Cost_Matrix_STRline)):
-        fileID.write(Cost_Matrix_STRline[i])
-
-    fileID.write(eof_line)
+    fileID.write(name_line.encode())
+    fileID.write(comment_line.encode())
+    fileID.write(tsp_line.encode())
+    fileID.write(dimension_line.encode())
+    fileID.write(edge_weight_type_line.encode())
+    fileID.write(edge_weight_format_line.encode())
+    fileID.write(edge_weight_section_line.encode())
+    write_matrix_section(fileID, CostMatrix, upper=symmetric)
+
+    fileID.write(eof_line.encode())
+    fileID.close()
+
+    fileID2 = writeLKHparameters(fname_tsp, work_dir)
+    return fileID, fileID2
+
+# write the problem given by the node coordinates and the TSPLIB metric (EUC_2D, ATT, ...)
+def writeTSPLIBfile_coords(fname_tsp,points,metric,user_comment,work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir, exist_ok=True)
+    points = np.asarray(points, dtype=float).reshape(-1, 2)
+    header = ('NAME : ' + fname_tsp + '\n'
+              + 'COMMENT : ' + user_comment + '\n'
+              + 'TYPE : TSP\n'
+              + 'DIMENSION : ' + str(len(points)) + '\n'
+              + 'EDGE_WEIGHT_TYPE : ' + metric + '\n'
+              + 'NODE_COORD_SECTION\n')
+
+    fileID = open((work_dir + fname_tsp + '.tsp'), "w")
+    fileID.write(header)
+    np.savetxt(fileID, np.column_stack((np.arange(1, len(points) + 1), points)), fmt=['%d', '%.3f', '%.3f'])
+    fileID.write('EOF\n')
     fileID.close()
 
-    fileID2 = open((tsplib_dir + fname_tsp + '.par'), "w")
+    fileID2 = writeLKHparameters(fname_tsp, work_dir)
+    return fileID, fileID2
+
+# write the ATSP given by the weighted EDGE_LIST, the nodes of the edges are numbered from 0
+def writeTSPLIBfile_edges(fname_tsp,dimension,edges,costs,user_comment,work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    if not os.path.exists(work_dir):
+        os.makedirs(work_dir, exist_ok=True)
+    edges = np.asarray(edges, dtype=np.int64).reshape(-1, 2)
+    header = ('NAME : ' + fname_tsp + '\n'
+              + 'COMMENT : ' + user_comment + '\n'
+              + 'TYPE : ATSP\n'
+              + 'DIMENSION : ' + str(dimension) + '\n'
+              + 'EDGE_DATA_FORMAT : EDGE_LIST\n'
+              + 'EDGE_DATA_SECTION\n')
+
+    fileID = open((work_dir + fname_tsp + '.tsp'), "wb")
+    fileID.write(header.encode())
+    # the costs are truncated as by int()
+    write_matrix_section(fileID, np.column_stack((edges + 1, np.asarray(costs).astype(np.int64))))
+    fileID.write(b'-1\nEOF\n')
+    fileID.close()
+
+    fileID2 = writeLKHparameters(fname_tsp, work_dir)
+    return fileID, fileID2
+
+# write the tour (sequence of the nodes numbered from 0) as a TSPLIB tour file, return its path
+def writeTSPLIBtour(fname_tsp, sequence, work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    fname_tour = work_dir + fname_tsp + '.tour'
+    fileID = open(fname_tour, "w")
+    fileID.write('NAME : ' + fname_tsp + '\n')
+    fileID.write('TYPE : TOUR\n')
+    fileID.write('DIMENSION : ' + str(len(sequence)) + '\n')
+    fileID.write('TOUR_SECTION\n')
+    fileID.write(''.join(str(node + 1) + '\n' for node in sequence))
+    fileID.write('-1\nEOF\n')
+    fileID.close()
+    return fname_tour
 
-    problem_file_line = 'PROBLEM_FILE = ' + tsplib_dir + fname_tsp + '.tsp' + '\n' # remove pwd + tsplib_dir
+# the parameters {KEYWORD: value} replace the values of the balanced profile, None keeps the value
+def writeLKHparameters(fname_tsp, work_dir=tsplib_dir, parameters=None):
+    work_dir = os.path.join(work_dir, '')
+    fileID2 = open((work_dir + fname_tsp + '.par'), "w")
+
+    settings = dict(LKH_profiles['balanced'])
+    for keyword, value in (parameters or {}).items():
+        if value is not None:
+            settings[keyword] = value
+
+    problem_file_line = 'PROBLEM_FILE = ' + work_dir + fname_tsp + '.tsp' + '\n' # remove pwd + tsplib_dir
     #optimum_line = 'OPTIMUM 378032' + '\n'
-    move_type_line = 'MOVE_TYPE = 5' + '\n'
-    patching_c_line = 'PATCHING_C = 3' + '\n'
-    patching_a_line = 'PATCHING_A = 2' + '\n'
-    runs_line = 'RUNS = 3' + '\n'
-    tour_file_line = 'TOUR_FILE = ' + tsplib_dir + fname_tsp + '.txt' + '\n'
+    tour_file_line = 'TOUR_FILE = ' + work_dir + fname_tsp + '.txt' + '\n'
 
     fileID2.write(problem_file_line)
     #fileID2.write(optimum_line)
-    fileID2.write(move_type_line)
-    fileID2.write(patching_c_line)
-    fileID2.write(patching_a_line)
-    fileID2.write(runs_line)
+    for keyword, value in settings.items():
+        fileID2.write(keyword + ' = ' + str(value) + '\n')
     fileID2.write(tour_file_line)
     fileID2.close()
-    return fileID, fileID2
+    return fileID2
 
 def copy_toTSPLIBdir_cmd(fname_basis):
     copy_toTSPLIBdir_cmd = 'cp' + ' ' + '/' + fname_basis + '.txt' + ' ' +  tsplib_dir
     os.system(copy_toTSPLIBdir_cmd)
 
-def run_LKHsolver_cmd(fname_basis):
-    run_lkh_cmd =  pwd + lkh_dir  + lkh_cmd + ' ' + tsplib_dir + fname_basis + '.par' + ' >/dev/null '
-    os.system(run_lkh_cmd)
+def LKH_command(fname_basis, work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    return [pwd + lkh_dir + lkh_cmd, work_dir + fname_basis + '.par']
+
+# run LKH and return its standard output, LKH is killed after the timeout
+def run_LKHsolver_cmd(fname_basis, work_dir=tsplib_dir, timeout=None):
+    try:
+        result = subprocess.run(LKH_command(fname_basis, work_dir), stdout=subprocess.PIPE,
+                                stderr=subprocess.STDOUT, timeout=timeout)
+    except subprocess.TimeoutExpired:
+        raise TimeoutError('LKH did not finish in %g s' % timeout) from None
+    output = result.stdout.decode(errors='replace')
+    check_LKHoutput(result.returncode, output)
+    return output
 
-def read_LKHresult_cmd(fname_basis):
-    f=open(tsplib_dir + fname_basis + '.txt')
+def read_LKHresult_cmd(fname_basis, work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    f=open(work_dir + fname_basis + '.txt')
     lines=f.readlines()
     f.close()
     
@@ -131,6 +529,22 @@ def read_LKHresult_cmd(fname_basis):
 
     return sequence
 
+# read the sequence and the cost (in the LKH units) of the tour file, None if the file is missing or incomplete
+def read_LKHtour(fname_basis, work_dir=tsplib_dir):
+    work_dir = os.path.join(work_dir, '')
+    try:
+        f = open(work_dir + fname_basis + '.txt')
+    except FileNotFoundError:
+        return None
+    lines = f.readlines()
+    f.close()
+
+    match = re.search(r'Length = (-?\d+)', ''.join(lines[:2]))
+    if not match or '-1\n' not in lines[6:]:
+        return None
+    sequence = [int(line) - 1 for line in lines[6:lines.index('-1\n', 6)]]
+    return sequence, int(match.group(1))
+
 def rm_solution_file_cmd(fname_basis):
     rm_sol_cmd = 'rm' + ' ' + fname_basis + '.txt'
     os.system(rm_sol_cmd) 
@@ -65,7 +65,7 @@ def load_problem(problem_file):
     return goals
 
 if __name__=="__main__":
-    planner = som.SOMSolver()
+    planner = som.SOMSolver(observers=[som.PrintProgress(), som.RingAnimation()])
     for problem, radius in dataset:
         problem_file = './problems/' + problem + '.txt'
 
@@ -84,7 +84,8 @@ for scenario in scenarios:
     ######################################
 
     if solver_type == 'NoonBean':
-        path, path_len = solver.plan_tour_noon_bean(goals, sensing_radius, radius)
+        # the balanced LKH effort takes minutes for the thousands of samples of burma14
+        path, path_len = solver.plan_tour_noon_bean(goals, sensing_radius, radius, profile='fast')
     elif solver_type == 'Decoupled':
         path, path_len = solver.plan_tour_decoupled(goals, sensing_radius, radius)
 
@@ -0,0 +1,9 @@
+import os
+import sys
+
+# the modules are imported as in the scripts, with their directories on the path
+root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+for directory in ('', 'lkh', 'data_collection'):
+    path = os.path.join(root, directory)
+    if path not in sys.path:
+        sys.path.insert(0, path)
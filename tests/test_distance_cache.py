@@ -0,0 +1,74 @@
+import os
+
+import numpy as np
+import pytest
+
+from DistanceCache import DistanceCache
+
+
+def samples(seed, sizes=(3, 2, 4)):
+    rng = np.random.default_rng(seed)
+    return [rng.uniform(0, 10, (m, 3)) for m in sizes]
+
+
+def test_key_depends_on_the_problem(tmp_path):
+    cache = DistanceCache(str(tmp_path))
+    cache_key = cache.key(samples(0), 1.0)
+    assert cache_key == cache.key([s.copy() for s in samples(0)], 1.0)
+    assert cache_key == cache.key(samples(0), 1)
+
+    changed = samples(0)
+    changed[1][0, 2] += 1e-9
+    assert cache_key != cache.key(changed, 1.0)
+    assert cache_key != cache.key(samples(0), 0.5)
+    assert cache_key != cache.key(samples(0), 1.0, neighbors=3)
+    # the same states split differently between the goals
+    regrouped = np.concatenate(samples(0))
+    assert cache_key != cache.key([regrouped[:2], regrouped[2:5], regrouped[5:]], 1.0)
+
+
+def test_hit_is_a_read_only_memory_map(tmp_path):
+    cache = DistanceCache(str(tmp_path))
+    expected = np.arange(16, dtype=float).reshape(4, 4)
+    calls = []
+
+    def build():
+        calls.append(1)
+        return expected
+
+    first = cache.distance_matrix(samples(0), 1.0, build)
+    second = cache.distance_matrix(samples(0), 1.0, build)
+
+    assert len(calls) == 1
+    assert isinstance(second, np.memmap)
+    np.testing.assert_array_equal(second, expected)
+    np.testing.assert_array_equal(first, expected)
+    with pytest.raises(ValueError):
+        second[0, 0] = 1
+    # other options are a different matrix
+    cache.distance_matrix(samples(0), 1.0, build, neighbors=3)
+    assert len(calls) == 2
+
+
+def test_least_recently_used_matrices_are_evicted(tmp_path):
+    matrix = np.zeros((16, 16))
+    cache = DistanceCache(str(tmp_path))
+    cache.put('a', matrix)
+    size = os.path.getsize(cache.path('a'))
+    cache.max_bytes = 2 * size
+    cache.put('b', matrix)
+
+    # a hit marks a as used after b
+    os.utime(cache.path('a'), (50, 50))
+    os.utime(cache.path('b'), (100, 100))
+    assert cache.get('a') is not None
+
+    cache.put('c', matrix)
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+
+    # the stored matrix is kept even if it alone exceeds the limit
+    cache.max_bytes = 1
+    cache.put('d', matrix)
+    assert sorted(os.listdir(str(tmp_path))) == ['d.npy']
@@ -0,0 +1,46 @@
+import numpy as np
+import pytest
+
+import DTSPNSolver
+
+
+def ragged_samples(seed, sizes, extent=20.0):
+    # e.g. the samples of the goals after the pruning
+    rng = np.random.default_rng(seed)
+    centers = rng.uniform(0, extent, (len(sizes), 2))
+    return [np.column_stack((c + rng.uniform(-1, 1, (m, 2)), rng.uniform(0, 2 * np.pi, m))) for c, m in zip(centers, sizes)]
+
+
+SIZES = (5, 1, 8, 3, 7, 2, 6, 4)
+
+
+def goal_mask(sizes, pairs):
+    cluster = np.repeat(np.arange(len(sizes)), sizes)
+    return pairs[cluster[:, None], cluster[None, :]]
+
+
+@pytest.mark.parametrize('neighbors', [None, 3])
+def test_parallel_tiles_equal_the_serial_matrix(neighbors):
+    samples = ragged_samples(0, SIZES)
+    expected = DTSPNSolver.sample_distance_matrix(samples, 1.0, neighbors=neighbors)
+
+    # the small tiles split the matrix between the goal groups
+    distances, tiles = DTSPNSolver.sample_distance_matrix_parallel(samples, 1.0, workers=2, max_pairs=100, neighbors=neighbors)
+
+    assert len(tiles) > 4
+    np.testing.assert_array_equal(distances, expected)
+
+
+def test_lazy_distances_bound_the_exact_ones():
+    samples = ragged_samples(1, SIZES)
+    exact = DTSPNSolver.sample_distance_matrix(samples, 1.0)
+    lazy = DTSPNSolver.sample_distance_matrix(samples, 1.0, neighbors=2)
+    near = goal_mask(SIZES, DTSPNSolver.near_goal_pairs(samples, 2))
+    same = goal_mask(SIZES, np.eye(len(SIZES), dtype=bool))
+
+    assert not near.all()
+    np.testing.assert_allclose(lazy[near], exact[near])
+    assert np.all(lazy >= exact - 1e-9)
+    # the bound is strict for the pairs of the far goals
+    assert np.all(lazy[~near & ~same] > exact[~near & ~same])
+    assert np.all(lazy[same] == 0)
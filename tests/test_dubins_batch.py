@@ -0,0 +1,82 @@
+import math
+
+import numpy as np
+import pytest
+
+import DubinsBatch
+
+
+def path_end(start, word, params, turning_radius):
+    # follow the three segments of the normalized path from the start state
+    origin = np.array([0.0, 0.0, start[2]])
+    state = origin
+    for turn, t in zip(DubinsBatch.SEGMENT_TURNS[word], params):
+        state = DubinsBatch._segment(np.asarray(t), state, turn)
+    return np.array([start[0] + turning_radius * state[0],
+                     start[1] + turning_radius * state[1],
+                     DubinsBatch.mod2pi(state[2])])
+
+
+@pytest.mark.parametrize('start, end, turning_radius, length', [
+    ((0, 0, 0), (4, 0, 0), 1.0, 4.0),
+    ((0, 0, 0), (0, 0, 0), 1.0, 0.0),
+    # half circle to the left
+    ((0, 0, 0), (0, 2, math.pi), 1.0, math.pi),
+    ((0, 0, 0), (0, 6, math.pi), 3.0, 3 * math.pi),
+    # quarter circle to the right and a straight segment
+    ((0, 0, 0), (1, -3, -math.pi / 2), 1.0, math.pi / 2 + 2),
+])
+def test_known_lengths(start, end, turning_radius, length):
+    assert DubinsBatch.shortest_path_lengths(start, end, turning_radius) == pytest.approx(length, abs=1e-9)
+
+
+def test_paths_end_at_the_end_states():
+    rng = np.random.default_rng(0)
+    starts = np.column_stack((rng.uniform(-5, 5, (500, 2)), rng.uniform(0, 2 * math.pi, 500)))
+    ends = np.column_stack((rng.uniform(-5, 5, (500, 2)), rng.uniform(0, 2 * math.pi, 500)))
+    turning_radius = 1.5
+    lengths, words, params = DubinsBatch.shortest_paths(starts, ends, turning_radius)
+
+    assert np.all(lengths >= np.hypot(*(ends - starts)[:, :2].T) - 1e-9)
+    np.testing.assert_allclose(params.sum(axis=1) * turning_radius, lengths)
+    for start, end, word, param in zip(starts, ends, words, params):
+        reached = path_end(start, word, param, turning_radius)
+        np.testing.assert_allclose(reached[:2], end[:2], atol=1e-9)
+        assert abs(math.remainder(reached[2] - end[2], 2 * math.pi)) < 1e-9
+
+
+def test_distance_matrix_matches_pairwise_lengths():
+    rng = np.random.default_rng(1)
+    starts = np.column_stack((rng.uniform(-5, 5, (7, 2)), rng.uniform(0, 2 * math.pi, 7)))
+    ends = np.column_stack((rng.uniform(-5, 5, (4, 2)), rng.uniform(0, 2 * math.pi, 4)))
+    distances = DubinsBatch.distance_matrix(starts, ends, 0.8)
+
+    assert distances.shape == (7, 4)
+    for a in range(7):
+        for b in range(4):
+            assert distances[a, b] == pytest.approx(DubinsBatch.shortest_path_lengths(starts[a], ends[b], 0.8))
+
+
+def test_sampled_tour_follows_the_paths():
+    rng = np.random.default_rng(2)
+    states = np.column_stack((rng.uniform(-5, 5, (6, 2)), rng.uniform(0, 2 * math.pi, 6)))
+    step = 0.1
+    samples, counts, lengths = DubinsBatch.sample_tour(states, 1.0, step)
+
+    np.testing.assert_array_equal(counts, np.ceil(lengths / step))
+    assert len(samples) == counts.sum()
+    # each path starts at its state and the consecutive samples are at most a step apart
+    firsts = np.cumsum(counts) - counts
+    np.testing.assert_allclose(samples[firsts, :2], states[:, :2], atol=1e-9)
+    assert np.all(np.hypot(*np.diff(samples[:, :2], axis=0).T) <= step + 1e-9)
+
+
+def test_matches_the_dubins_library():
+    dubins = pytest.importorskip('dubins')
+    rng = np.random.default_rng(3)
+    starts = np.column_stack((rng.uniform(-5, 5, (200, 2)), rng.uniform(0, 2 * math.pi, 200)))
+    ends = np.column_stack((rng.uniform(-5, 5, (200, 2)), rng.uniform(0, 2 * math.pi, 200)))
+    lengths = DubinsBatch.shortest_path_lengths(starts, ends, 1.0)
+    for start, end, length in zip(starts, ends, lengths):
+        path = dubins.shortest_path(tuple(start), tuple(end), 1.0)
+        assert length == pytest.approx(path.path_length(), abs=1e-9)
@@ -0,0 +1,57 @@
+import io
+
+import numpy as np
+import pytest
+
+import invoke_LKH
+
+
+def written(matrix, upper, chunk_bytes=2**24):
+    f = io.BytesIO()
+    invoke_LKH.write_matrix_section(f, matrix, upper, chunk_bytes)
+    return f.getvalue().decode()
+
+
+def expected_values(matrix, upper):
+    if upper:
+        return matrix[np.triu_indices(len(matrix), 1)]
+    return matrix.ravel()
+
+
+@pytest.mark.parametrize('upper', [False, True])
+@pytest.mark.parametrize('largest', [0, 1, 9, 10, 99, 100, 999, 1000, 10**6, 10**9 - 1, 10**9])
+def test_matrix_section_round_trip(upper, largest):
+    rng = np.random.default_rng(largest)
+    matrix = rng.integers(0, largest + 1, (7, 7))
+    # the powers of ten and the zeros around the width of the largest value
+    powers = [10**k for k in range(len(str(largest)))]
+    matrix.ravel()[:len(powers)] = powers
+    matrix[3] = 0
+    matrix[-1, -1] = largest
+
+    # the small chunks split the matrix between the rows
+    for chunk_bytes in (1, 40, 2**24):
+        text = written(matrix, upper, chunk_bytes)
+        np.testing.assert_array_equal(np.array(text.split(), dtype=np.int64), expected_values(matrix, upper))
+        if not upper:
+            lines = text.splitlines()
+            assert len(lines) == len(matrix)
+            assert len(set(map(len, lines))) == 1
+
+
+def test_matrix_section_fuzz():
+    rng = np.random.default_rng(0)
+    for _ in range(200):
+        n = int(rng.integers(1, 12))
+        matrix = rng.integers(0, 10**int(rng.integers(1, 10)), (n, n))
+        matrix[rng.random((n, n)) < 0.2] = 0
+        upper = bool(rng.integers(2))
+        text = written(matrix, upper, int(rng.integers(1, 200)))
+        np.testing.assert_array_equal(np.array(text.split(), dtype=np.int64), expected_values(matrix, upper))
+
+
+@pytest.mark.parametrize('upper', [False, True])
+def test_matrix_section_with_negative_values(upper):
+    matrix = np.array([[0, -5, 12], [7, 0, -1], [3, 100, 0]])
+    text = written(matrix, upper)
+    np.testing.assert_array_equal(np.array(text.split(), dtype=np.int64), expected_values(matrix, upper))
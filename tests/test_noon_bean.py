@@ -0,0 +1,143 @@
+import itertools
+import os
+
+import numpy as np
+import pytest
+
+import DTSPNSolver
+import invoke_LKH
+from messages import Vector3
+
+requires_lkh = pytest.mark.skipif(not os.path.exists(invoke_LKH.LKH_command('problem')[0]), reason='LKH is not built')
+
+
+def atsp_optimum(atsp):
+    # exhaustive search of the tours starting at the node 0
+    nodes = range(1, len(atsp))
+    best = None
+    for order in itertools.permutations(nodes):
+        tour = (0,) + order
+        cost = sum(atsp[a, b] for a, b in zip(tour, tour[1:] + tour[:1]))
+        if best is None or cost < best[0]:
+            best = (cost, list(tour))
+    return best[1]
+
+
+def gtsp_optimum(distances, offsets):
+    # exhaustive search of the goal orders starting at the goal 0 and of the samples
+    N = len(offsets) - 1
+    best = np.inf
+    for order in itertools.permutations(range(1, N)):
+        goals = (0,) + order
+        for choice in itertools.product(*[range(offsets[g], offsets[g + 1]) for g in goals]):
+            best = min(best, sum(distances[a, b] for a, b in zip(choice, choice[1:] + choice[:1])))
+    return best
+
+
+def gtsp_cost(distances, offsets, goal_sequence, selected):
+    nodes = [offsets[g] + s for g, s in zip(goal_sequence, selected)]
+    return sum(distances[a, b] for a, b in zip(nodes, nodes[1:] + nodes[:1]))
+
+
+@pytest.mark.parametrize('sizes', [(2, 3, 1, 2), (1, 1, 2, 3), (2, 2, 2)])
+def test_transform_preserves_the_gtsp_optimum(sizes):
+    rng = np.random.default_rng(sum(sizes))
+    offsets = np.cumsum([0] + list(sizes))
+    distances = rng.uniform(1, 10, (offsets[-1], offsets[-1]))
+
+    atsp = DTSPNSolver.noon_bean_transform(distances, offsets)
+    goal_sequence, selected = DTSPNSolver.noon_bean_decode(atsp_optimum(atsp), offsets)
+
+    assert sorted(goal_sequence) == list(range(len(sizes)))
+    assert all(0 <= s < sizes[g] for g, s in zip(goal_sequence, selected))
+    assert gtsp_cost(distances, offsets, goal_sequence, selected) == pytest.approx(gtsp_optimum(distances, offsets))
+
+
+def test_decode_selects_the_entry_samples():
+    offsets = np.array([0, 3, 5, 6])
+    # goal 1 is entered at its sample 1, goal 2 at 0 and goal 0 at 2, the tour wraps around
+    for sequence in ([0, 1, 4, 3, 5, 2], [1, 4, 3, 5, 2, 0], [5, 2, 0, 1, 4, 3]):
+        goal_sequence, selected = DTSPNSolver.noon_bean_decode(sequence, offsets)
+        # the decoded tour may start at any goal
+        shift = list(goal_sequence).index(1)
+        np.testing.assert_array_equal(np.roll(goal_sequence, -shift), [1, 2, 0])
+        np.testing.assert_array_equal(np.roll(selected, -shift), [1, 0, 2])
+
+
+def test_sparse_edges_skip_the_cycle_of_a_single_sample():
+    rng = np.random.default_rng(7)
+    sizes = (4, 1, 3, 5)
+    samples = [np.column_stack((rng.uniform(0, 10, (m, 2)), rng.uniform(0, 2 * np.pi, m))) for m in sizes]
+
+    edges, costs, offsets = DTSPNSolver.sparse_noon_bean_edges(samples, 1.0, neighbors=3, candidates=None)
+
+    # LKH rejects the loop edges
+    assert np.all(edges[:, 0] != edges[:, 1])
+    assert len(np.unique(edges, axis=0)) == len(edges)
+    # the zero-cost edges are the cycles of the goals with several samples
+    assert np.count_nonzero(costs == 0) == sum(m for m in sizes if m > 1)
+
+    # the penalized edges carry the costs of the dense transform
+    distances = DTSPNSolver.sample_distance_matrix(samples, 1.0)
+    atsp = DTSPNSolver.noon_bean_transform(distances, offsets)
+    leaving = costs > 0
+    np.testing.assert_allclose(costs[leaving] - atsp[edges[leaving, 0], edges[leaving, 1]], 0, atol=1e-6)
+
+
+def random_samples(rng, sizes, extent=10.0):
+    centers = rng.uniform(0, extent, (len(sizes), 2))
+    return [np.column_stack((c + rng.uniform(-0.5, 0.5, (m, 2)), rng.uniform(0, 2 * np.pi, m))) for c, m in zip(centers, sizes)]
+
+
+def test_sparse_edges_of_the_pruned_samples():
+    samples = random_samples(np.random.default_rng(3), (6, 6, 6, 6, 6))
+    # without the slack most goals keep a single sample
+    kept = DTSPNSolver.prune_samples(samples, 1.0, neighbors=2, slack=0.0)
+    assert any(len(k) == 1 for k in kept)
+
+    pruned = [s[k] for s, k in zip(samples, kept)]
+    edges, costs, offsets = DTSPNSolver.sparse_noon_bean_edges(pruned, 1.0, neighbors=2)
+    assert np.all(edges[:, 0] != edges[:, 1])
+    assert np.all((edges >= 0) & (edges < offsets[-1]))
+
+
+@requires_lkh
+def test_solve_pruned_sparse_noon_bean():
+    sizes = (1, 4, 1, 4, 3, 1)
+    samples = random_samples(np.random.default_rng(5), sizes)
+
+    sequence, selected, report = DTSPNSolver.solve_noon_bean(samples, 1.0, prune=True, sparse=True, return_report=True)
+
+    assert sorted(sequence) == list(range(len(sizes)))
+    assert all(0 <= s < sizes[g] for g, s in zip(sequence, selected))
+    assert np.all(report['kept'] >= 1) and np.all(report['kept'] <= sizes)
+
+
+def test_solve_noon_bean_passes_the_lkh_profile():
+    samples = random_samples(np.random.default_rng(9), (2, 3, 2))
+    with pytest.raises(ValueError):
+        DTSPNSolver.solve_noon_bean(samples, 1.0, profile='unknown')
+    with pytest.raises(ValueError):
+        DTSPNSolver.solve_noon_bean(samples, 1.0, sparse=True, profile='unknown')
+
+
+@requires_lkh
+def test_solve_noon_bean_with_the_fast_profile():
+    sizes = (3, 2, 4, 2, 3)
+    samples = random_samples(np.random.default_rng(11), sizes)
+    sequence, selected = DTSPNSolver.solve_noon_bean(samples, 1.0, profile='fast', parameters={'RUNS': 2}, time_limit=1.0)
+    assert sorted(sequence) == list(range(len(sizes)))
+    assert all(0 <= s < sizes[g] for g, s in zip(sequence, selected))
+
+
+@requires_lkh
+def test_plan_tour_noon_bean_reports_the_pruning():
+    goals = [Vector3(x, y, 0) for x, y in [(0, 0), (4, 1), (5, 5), (1, 6), (-3, 3)]]
+
+    path, length, report = DTSPNSolver.plan_tour_noon_bean(goals, 0.5, 1.0, prune={'neighbors': 2, 'slack': 0.5},
+                                                           profile='fast', return_report=True)
+
+    assert length > 0 and len(path) > 0
+    np.testing.assert_array_equal(report['samples'], 64)
+    assert np.all(report['kept'] >= 1) and report['kept'].sum() < report['samples'].sum()
+    assert report['prune_time'] >= 0
@@ -0,0 +1,29 @@
+import os
+
+import numpy as np
+import pytest
+
+import invoke_LKH
+
+requires_lkh = pytest.mark.skipif(not os.path.exists(invoke_LKH.LKH_command('problem')[0]), reason='LKH is not built')
+
+
+def test_duplicate_seeds_are_rejected():
+    points = np.random.default_rng(0).uniform(0, 100, (20, 2))
+    with pytest.raises(ValueError):
+        invoke_LKH.solve_TSP_coords_portfolio(points, seeds=[1, 2, 1])
+
+
+def test_time_limit_leaves_the_preprocessing_margin():
+    assert invoke_LKH.portfolio_time_limit(8.0, 1) < 8.0 * (1 - invoke_LKH.portfolio_margin) + 0.01
+    assert invoke_LKH.portfolio_time_limit(8.0, 4) < invoke_LKH.portfolio_time_limit(8.0, 1)
+    # LKH stops before the first trial without a positive time limit
+    assert invoke_LKH.portfolio_time_limit(0.0, 3) > 0
+
+
+@requires_lkh
+def test_portfolio_returns_a_tour_by_the_deadline():
+    points = np.random.default_rng(0).uniform(0, 1000, (1500, 2))
+    sequence, report = invoke_LKH.solve_TSP_coords_portfolio(points, seeds=4, deadline=2.0, return_report=True, profile='fast')
+    assert sorted(sequence) == list(range(len(points)))
+    assert report['wall_time'] < 2.5
@@ -0,0 +1,31 @@
+import numpy as np
+
+import invoke_LKH
+
+
+def test_repair_tour_makes_a_permutation():
+    points = np.random.default_rng(0).uniform(0, 100, (10, 2))
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+    # None, out of range and repeated nodes, the nodes 2, 6 and 9 are missing
+    previous = [0, None, 4, 12, 1, 4, -1, 3, 8, 0, 5, 7]
+
+    tour = invoke_LKH.repair_tour(previous, distances)
+
+    assert sorted(tour) == list(range(10))
+    # the kept nodes stay in their order
+    kept = [node for node in tour if node not in (2, 6, 9)]
+    assert kept == [0, 4, 1, 3, 8, 5, 7]
+
+
+def test_repair_tour_inserts_at_the_cheapest_edge():
+    points = np.array([[0, 0], [10, 0], [10, 10], [0, 10], [5, 0]], dtype=float)
+    distances = np.linalg.norm(points[:, None] - points[None], axis=2)
+
+    tour = invoke_LKH.repair_tour([0, 1, 2, 3], distances)
+
+    assert tour == [0, 4, 1, 2, 3]
+
+
+def test_repair_tour_from_an_empty_sequence():
+    distances = np.ones((3, 3)) - np.eye(3)
+    assert sorted(invoke_LKH.repair_tour([None, 7], distances)) == [0, 1, 2]
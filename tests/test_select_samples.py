@@ -0,0 +1,31 @@
+import itertools
+import math
+
+import numpy as np
+import pytest
+
+import DTSPNSolver
+
+
+def random_samples(rng, sizes):
+    return [np.column_stack((rng.uniform(-5, 5, (m, 2)), rng.uniform(0, 2 * math.pi, m))) for m in sizes]
+
+
+@pytest.mark.parametrize('sizes, sequence', [
+    ((3, 3, 3, 3), [0, 1, 2, 3]),
+    ((2, 4, 1, 3), [2, 0, 3, 1]),
+    ((4, 4), [1, 0]),
+])
+def test_matches_brute_force(sizes, sequence):
+    rng = np.random.default_rng(len(sizes))
+    samples = random_samples(rng, sizes)
+    turning_radius = 1.0
+
+    selected, length = DTSPNSolver.select_samples(samples, sequence, turning_radius)
+
+    best = min(DTSPNSolver.tour_configurations_length([samples[g][s] for g, s in zip(sequence, choice)], turning_radius)
+               for choice in itertools.product(*[range(sizes[g]) for g in sequence]))
+    assert length == pytest.approx(best)
+    # the reported length is the length of the tour of the selected samples
+    configurations = [samples[g][s] for g, s in zip(sequence, selected)]
+    assert DTSPNSolver.tour_configurations_length(configurations, turning_radius) == pytest.approx(length)
@@ -0,0 +1,31 @@
+import asyncio
+import os
+
+import numpy as np
+import pytest
+
+import invoke_LKH
+
+pytestmark = pytest.mark.skipif(not os.path.exists(invoke_LKH.LKH_command('problem')[0]), reason='LKH is not built')
+
+
+def distance_matrix(n=30):
+    points = np.random.default_rng(0).uniform(0, 100, (n, 2))
+    return np.linalg.norm(points[:, None] - points[None], axis=2)
+
+
+def test_async_equals_the_synchronous_solution():
+    distances = distance_matrix()
+    options = dict(profile='fast', parameters={'SEED': 3})
+    sequence = invoke_LKH.solve_TSP(distances, **options)
+    assert asyncio.run(invoke_LKH.solve_TSP_async(distances, **options)) == sequence
+
+
+def test_async_warm_start():
+    distances = distance_matrix()
+    previous = [None, 3, 3, 99] + list(range(10, 30))
+    sequence, report = asyncio.run(invoke_LKH.solve_TSP_async(distances, return_report=True, initial_tour=previous,
+                                                              max_trials=5))
+    assert sorted(sequence) == list(range(len(distances)))
+    length = sum(distances[a, b] for a, b in zip(sequence, sequence[1:] + sequence[:1]))
+    assert report['cost'] == pytest.approx(length, rel=1e-3)
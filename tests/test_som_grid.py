@@ -0,0 +1,29 @@
+import numpy as np
+import pytest
+
+from messages import Pose, Quaternion, Vector3
+from SOMSolver import SOMSolver, tour_length
+
+
+def test_grid_tour_is_close_to_the_linear_scan():
+    points = np.random.default_rng(0).uniform(0, 1000, (200, 2))
+    goals = [Pose(Vector3(x, y, 0), Quaternion(0, 0, 0, 1)) for x, y in points]
+
+    exact = tour_length(SOMSolver(seed=1).plan_tour(goals))
+    tour, stats = SOMSolver(seed=1, spatial_index='grid').plan_tour(goals, return_stats=True)
+
+    assert len(tour.poses) == len(goals) + 1
+    assert stats.index_misses == 0
+    assert abs(tour_length(tour) - exact) <= 0.05 * exact
+
+
+def test_verified_grid_counts_the_misses():
+    points = np.random.default_rng(0).uniform(0, 1000, (200, 2))
+    goals = [Pose(Vector3(x, y, 0), Quaternion(0, 0, 0, 1)) for x, y in points]
+
+    exact = tour_length(SOMSolver(seed=1).plan_tour(goals))
+    tour, stats = SOMSolver(seed=1, spatial_index='grid', verify_index=True).plan_tour(goals, return_stats=True)
+
+    # the verified winners are the exact ones, only the negligible gains below beta_min are skipped
+    assert tour_length(tour) == pytest.approx(exact, rel=1e-3)
+    assert 0 < stats.index_misses <= 0.4 * stats.epochs * len(goals)
@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+from messages import Pose, Quaternion, Vector3
+from SOMSolver import NeuronRing, SOMSolver
+
+
+def poses(points):
+    return [Pose(Vector3(x, y, 0), Quaternion(0, 0, 0, 1)) for x, y in points]
+
+
+def tour_points(tour):
+    return np.array([(p.position.x, p.position.y) for p in tour.poses])[:-1]
+
+
+def assert_visits_each_goal_once(solver):
+    winners = solver.ring.goal_idx[solver.ring.goal_idx >= 0]
+    np.testing.assert_array_equal(np.sort(winners), np.arange(solver.N))
+    # with the zero radius the tour passes through the goals
+    visited = tour_points(solver.make_tour())
+    np.testing.assert_allclose(visited[np.lexsort(visited.T)], solver.np_goals[np.lexsort(solver.np_goals.T)])
+
+
+@pytest.fixture
+def planned():
+    points = np.random.default_rng(1).uniform(0, 100, (30, 2))
+    solver = SOMSolver(seed=1)
+    tour = solver.plan_tour(poses(points))
+    return solver, points, tour
+
+
+def test_replan_after_adds_and_removes(planned):
+    solver, points, _ = planned
+    added = np.random.default_rng(2).uniform(0, 100, (4, 2))
+    solver.replan_tour(added=poses(added), removed=[0, 7, 29])
+
+    assert solver.N == 31
+    np.testing.assert_allclose(solver.np_goals, np.vstack((np.delete(points, [0, 7, 29], axis=0), added)))
+    assert_visits_each_goal_once(solver)
+
+    # repeated replanning keeps the bookkeeping consistent
+    solver.replan_tour(added=poses([(50, 50)]), removed=[3])
+    assert solver.N == 31
+    assert_visits_each_goal_once(solver)
+
+
+def test_replan_from_a_path(planned):
+    solver, points, tour = planned
+    replanner = SOMSolver(seed=2)
+    replanner.replan_tour(added=poses([(20, 80)]), removed=[5], previous=tour, goals=poses(points))
+
+    assert replanner.N == 30
+    assert_visits_each_goal_once(replanner)
+
+
+def test_replan_from_a_small_ring(planned):
+    solver, points, _ = planned
+    # the ring does not fit the goals, the learning starts from its shape
+    ring = NeuronRing(10)
+    ring.init_ellipse(np.mean(points, axis=0), np.std(points, axis=0))
+    solver.replan_tour(added=poses([(10, 10)]), previous=ring)
+
+    assert len(solver.ring) == int(2.5 * solver.N)
+    assert_visits_each_goal_once(solver)
+
+
+@pytest.mark.parametrize('removed', [[-1], [30], [2, -3]])
+def test_replan_rejects_invalid_removed_indices(planned, removed):
+    solver, _, _ = planned
+    goals = solver.np_goals.copy()
+    with pytest.raises(ValueError):
+        solver.replan_tour(removed=removed)
+    np.testing.assert_array_equal(solver.np_goals, goals)